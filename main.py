@@ -2,22 +2,108 @@
 
 import os
 import re
-import javalang
+import json
 import sys
-from openai import OpenAI
-from pygments import highlight
-from pygments.lexers import JavaLexer
-from pygments.formatters import TerminalFormatter
+import asyncio
+import bisect
+import functools
+import hashlib
+import pickle
+import tempfile
+import httpx
+from openai import OpenAI, AsyncOpenAI, RateLimitError
 from dotenv import load_dotenv
 from pathlib import Path
 
+try:
+    import numpy as np
+    from numba import njit
+    _HAVE_NUMBA = True
+except ImportError:
+    _HAVE_NUMBA = False
+
+try:
+    import tiktoken
+    _HAVE_TIKTOKEN = True
+except ImportError:
+    _HAVE_TIKTOKEN = False
+
 script_dir = Path(__file__).resolve().parent
 load_dotenv(dotenv_path=script_dir / '.env')
-client = OpenAI()
+
+# One keep-alive HTTP/2 connection multiplexes the batched and fanned-out
+# requests instead of paying TCP/TLS setup per call
+_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=50, keepalive_expiry=60)
+_HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+client = OpenAI(http_client=httpx.Client(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT))
+async_client = AsyncOpenAI(http_client=httpx.AsyncClient(http2=True, limits=_HTTP_LIMITS, timeout=_HTTP_TIMEOUT))
+
+# Loaded once at import instead of being rebuilt into the messages per call
+SYSTEM_PROMPT = (script_dir / 'system_prompt.txt').read_text(encoding='utf-8')
+
+MODEL = os.environ.get('JAVADOC_MODEL', 'gpt-4o-mini')
+MAX_TOKENS = int(os.environ.get('JAVADOC_MAX_TOKENS', '160'))
+
+SYSTEM_PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode('utf-8')).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding():
+    try:
+        return tiktoken.encoding_for_model(MODEL)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+def _max_tokens_for(method_code):
+    """
+    Derive the output budget from the method's input size: trivial methods
+    get short javadocs, long ones get room to document their parameters,
+    instead of one fixed cap that truncates or over-allocates. Falls back
+    to JAVADOC_MAX_TOKENS when tiktoken is unavailable.
+    """
+    if not _HAVE_TIKTOKEN:
+        return MAX_TOKENS
+    in_tok = len(_get_encoding().encode(method_code))
+    return min(400, max(80, in_tok // 2 + 60))
+
+_BLANK_RUN_RE = re.compile(r'\n\s*\n+')
+
+def _normalize_method_code(method_code):
+    """
+    Strip per-line leading whitespace and collapse runs of blank lines so
+    cosmetic reformatting does not miss the javadoc cache.
+    """
+    stripped = '\n'.join(line.strip() for line in method_code.splitlines())
+    return _BLANK_RUN_RE.sub('\n', stripped).strip()
+
+def _javadoc_cache_file(method_code, user_description):
+    key = hashlib.sha256(
+        f"{SYSTEM_PROMPT_HASH}|{_normalize_method_code(method_code)}|{user_description}"
+        .encode('utf-8')).hexdigest()
+    return script_dir / '.javadoc_cache' / key[:2] / f"{key}.txt"
+
+def _javadoc_cache_get(method_code, user_description):
+    cache_file = _javadoc_cache_file(method_code, user_description)
+    if cache_file.is_file():
+        return cache_file.read_text(encoding='utf-8')
+    return None
+
+def _javadoc_cache_put(method_code, user_description, javadoc):
+    cache_file = _javadoc_cache_file(method_code, user_description)
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(javadoc)
+    os.replace(tmp_path, cache_file)
 
 def read_java_file(file_path):
+    """
+    Read the source once and return it with its line-offset table. The
+    offsets are the only per-line structure kept in memory; lines are sliced
+    out of the single source string on demand.
+    """
     with open(file_path, 'r', encoding='utf-8') as file:
-        return file.read()
+        content = file.read()
+    return content, build_line_offsets(content)
 
 def write_java_file(file_path, content):
     with open(file_path, 'w', encoding='utf-8') as file:
@@ -39,56 +125,255 @@ def is_setter(method):
         (method.return_type is None or str(method.return_type) == 'void')
     )
 
-def get_method_positions(java_code):
+def _cache_path(java_code, strict):
+    digest = hashlib.sha256(java_code.encode('utf-8')).hexdigest()
+    suffix = '.strict.pkl' if strict else '.pkl'
+    return script_dir / '.ast_cache' / f"{digest}{suffix}"
+
+# The quantified groups must not all accept bare whitespace: a modifier can
+# only be a keyword plus its trailing space and the return type must start
+# with a word character, otherwise the whitespace runs left behind by
+# _blank_non_code trigger catastrophic backtracking
+METHOD_RE = re.compile(
+    r'^[ \t]*((?:(?:public|private|protected|static|final|abstract|synchronized)\s+)*)'
+    r'(\w[\w<>,\s\[\]]*?)\s+(\w+)\s*\(([^)]*)\)\s*(?:throws [^{;]+)?\s*[{;]',
+    re.M)
+CLASS_RE = re.compile(r'\b((?:(?:public|private|protected|static|final|abstract)\s+)*)class\s+(\w+)')
+_BLANK_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*[\s\S]*?\*/')
+_NEWLINE_RE = re.compile(r'\n')
+_BRACE_RE = re.compile(r'[{}]')
+_MODIFIER_KEYWORDS = {'public', 'private', 'protected', 'static', 'final', 'abstract', 'synchronized'}
+_CONTROL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'return', 'new', 'else', 'do', 'try',
+                     'throw', 'assert'}
+
+def _blank_non_code(java_code):
+    """
+    Replace string/char literals and comments with spaces of equal length
+    (newlines preserved) so brace counting and signature matching only see
+    real code.
+    """
+    def blank(m):
+        return ''.join('\n' if c == '\n' else ' ' for c in m.group())
+    return _BLANK_RE.sub(blank, java_code)
+
+def _match_method_fields(m):
+    """
+    Interpret a METHOD_RE match. Returns (name, return_type, params,
+    modifiers), or None when the match is not a documentable method: a
+    statement keyword posing as name or return type, a constructor, or a
+    getter/setter (same inference as the javalang path).
+    """
+    name = m.group(3)
+    return_type = m.group(2).strip()
+    # The captured "return type" can be several words, e.g. the
+    # "throw new" of a throw statement — skip if any token is one
+    if name in _CONTROL_KEYWORDS or _CONTROL_KEYWORDS & set(return_type.split()):
+        return None
+    if return_type in _MODIFIER_KEYWORDS:
+        return None  # No real return type: a constructor, not a method
+    params = [p.strip() for p in m.group(4).split(',') if p.strip()]
+    if (name.startswith('get') or name.startswith('is')) and not params and return_type != 'void':
+        return None
+    if name.startswith('set') and len(params) == 1 and return_type == 'void':
+        return None
+    return name, return_type, params, set(m.group(1).split())
+
+def get_method_positions_fast(java_code):
+    """
+    Find method declarations with a precompiled regex plus a brace-depth
+    class stack, without building a full AST. Javadoc detection downstream
+    still runs against the original source.
+    """
+    blanked = _blank_non_code(java_code)
+    line_starts = [0] + [m.end() for m in _NEWLINE_RE.finditer(blanked)]
+
+    events = []
+    for m in CLASS_RE.finditer(blanked):
+        events.append((m.start(), 'class', m))
+    for m in METHOD_RE.finditer(blanked):
+        events.append((m.start(3), 'method', m))
+    for m in _BRACE_RE.finditer(blanked):
+        events.append((m.start(), m.group(), None))
+    events.sort(key=lambda e: e[0])
+
+    method_positions = []
+    class_stack = []  # (header, brace_depth_when_entered)
+    depth = 0
+
+    for offset, kind, m in events:
+        if kind == '{':
+            depth += 1
+        elif kind == '}':
+            depth -= 1
+            while class_stack and depth <= class_stack[-1][1]:
+                class_stack.pop()
+        elif kind == 'class':
+            modifiers = ' '.join(m.group(1).split())
+            class_stack.append((f"{modifiers} class {m.group(2)}".strip(), depth))
+        else:
+            fields = _match_method_fields(m)
+            if fields is None:
+                continue
+            name, return_type, params, modifiers = fields
+
+            line_index = bisect.bisect_right(line_starts, offset) - 1
+            column = offset - line_starts[line_index] + 1
+            method_positions.append({
+                'name': name,
+                'position': (line_index + 1, column),
+                'parameters': params,
+                'return_type': None if return_type == 'void' else return_type,
+                'modifiers': modifiers,
+                'hierarchy': ' > '.join(hdr for hdr, _ in class_stack)
+            })
+
+    return method_positions
+
+def _fast_all_documented(java_code):
+    """
+    Cheap prefilter: one regex scan over the raw source checking that every
+    method declaration is directly preceded by a javadoc comment (allowing
+    annotations in between), using the same pattern as has_javadoc. Only the
+    True answer is trusted — it lets main() skip the parse and walk entirely
+    on fully documented files. A stray match inside a comment or string just
+    disables the shortcut.
+    """
+    for m in METHOD_RE.finditer(java_code):
+        if _match_method_fields(m) is None:
+            continue  # Control statements, constructors, getters/setters
+        window = java_code[max(0, m.start() - 2048):m.start()]
+        if not _JAVADOC_ABOVE.search(window):
+            return False
+    return True
+
+def _get_javalang():
+    # ~200ms of import paid only when the --strict parse actually runs
+    import javalang.tree
+    return javalang
+
+def _node_children(node):
+    javalang = _get_javalang()
+    for child in node.children:
+        if isinstance(child, list):
+            for item in child:
+                if isinstance(item, javalang.ast.Node):
+                    yield item
+        elif isinstance(child, javalang.ast.Node):
+            yield child
+
+@functools.lru_cache(maxsize=None)
+def _join_hierarchy(stack):
+    return ' > '.join(stack)
+
+def get_method_positions(java_code, strict=False):
+    use_cache = os.environ.get('PYJAVADOC_CACHE') == '1'
+    cache_file = _cache_path(java_code, strict) if use_cache else None
+
+    if use_cache and cache_file.is_file():
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+
+    if not strict:
+        method_positions = get_method_positions_fast(java_code)
+        if use_cache:
+            cache_file.parent.mkdir(exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent)
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(method_positions, f)
+            os.replace(tmp_path, cache_file)
+        return method_positions
+
+    javalang = _get_javalang()
     tree = javalang.parse.parse(java_code)
     method_positions = []
+    class_stack = []
+
+    def visit(node):
+        if isinstance(node, javalang.tree.ClassDeclaration):
+            # Compute the header once on entry instead of re-joining it for
+            # every method found underneath this class
+            modifiers = ' '.join(node.modifiers) if node.modifiers else ''
+            class_stack.append(f"{modifiers} class {node.name}".strip())
+            for child in _node_children(node):
+                visit(child)
+            class_stack.pop()
+            return
 
-    for path, node in tree:
         if isinstance(node, javalang.tree.MethodDeclaration):
             if is_getter(node) or is_setter(node):
-                continue  # Skip getters and setters
-
-            # Build class hierarchy
-            class_hierarchy = []
-            for ancestor in path:
-                if isinstance(ancestor, javalang.tree.ClassDeclaration):
-                    modifiers = ' '.join(ancestor.modifiers) if ancestor.modifiers else ''
-                    class_hierarchy.append(f"{modifiers} class {ancestor.name}".strip())
-            full_hierarchy = ' > '.join(class_hierarchy)
+                return  # Skip getters and setters
 
+            # Keep only plain values so the list pickles without javalang nodes
             method_positions.append({
                 'name': node.name,
-                'position': node.position,
-                'parameters': node.parameters,
-                'return_type': node.return_type,
-                'modifiers': node.modifiers,
-                'hierarchy': full_hierarchy
+                'position': (node.position.line, node.position.column),
+                'parameters': [str(param) for param in node.parameters],
+                'return_type': str(node.return_type) if node.return_type is not None else None,
+                'modifiers': set(node.modifiers),
+                'hierarchy': _join_hierarchy(tuple(class_stack))
             })
 
+        for child in _node_children(node):
+            visit(child)
+
+    visit(tree)
+
+    if use_cache:
+        cache_file.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(method_positions, f)
+        os.replace(tmp_path, cache_file)
+
     return method_positions
 
-def has_javadoc(java_code_lines, line_number):
+def build_line_offsets(java_code):
     """
-    Check if there is a JavaDoc comment immediately above the given line number.
+    Offsets of the first character of every line, for slicing lines out of
+    the source without materializing a list of lines.
     """
-    index = line_number - 2  # Convert to 0-based index and move one line up
-    while index >= 0:
-        line = java_code_lines[index].strip()
-        if line == '':
-            index -= 1
-            continue
-        if line.startswith('/**'):
-            return True
-        if line.startswith('//') or line.startswith('/*'):
-            return False
-        break
-    return False
+    return [0] + [m.end() for m in _NEWLINE_RE.finditer(java_code)]
 
-def print_highlighted_java_code(code):
-    highlighted = highlight(code, JavaLexer(), TerminalFormatter())
-    print(highlighted)
+def get_line(java_code, line_offsets, line_number):
+    start = line_offsets[line_number - 1]
+    if line_number < len(line_offsets):
+        return java_code[start:line_offsets[line_number] - 1]
+    return java_code[start:]
 
-def prompt_user_for_description(class_hierarchy, method_name, method_code, java_code_lines, line_number):
+# A whole javadoc comment (tempered so it ends at its own first '*/'),
+# optionally followed by annotations, right before the window end
+_JAVADOC_ABOVE = re.compile(r'/\*\*(?:(?!\*/)[\s\S])*\*/\s*(?:@\w+(?:\([^)]*\))?\s*)*\Z')
+
+def has_javadoc(java_code, line_offsets, line_number):
+    """
+    Check if there is a JavaDoc comment immediately above the given line
+    number, with one compiled-regex search over a bounded window of the
+    source instead of a per-line stripping loop.
+    """
+    line_offset = line_offsets[line_number - 1]
+    window = java_code[max(0, line_offset - 2048):line_offset]
+    return bool(_JAVADOC_ABOVE.search(window))
+
+# Comments first, then strings, then keywords, so a keyword inside a
+# comment or literal is not recolored
+_HIGHLIGHT_RE = re.compile(
+    r'(//[^\n]*|/\*[\s\S]*?\*/)'
+    r'|("(?:\\.|[^"\\\n])*")'
+    r'|\b(public|private|protected|static|final|abstract|synchronized|class|interface|enum'
+    r'|return|new|if|else|for|while|do|switch|case|break|continue|try|catch|finally|throw|throws'
+    r'|void|int|long|short|byte|float|double|boolean|char|String)\b')
+
+def print_highlighted_java_code(code):
+    def paint(m):
+        if m.group(1):
+            return f'\x1b[32m{m.group(1)}\x1b[0m'  # comments
+        if m.group(2):
+            return f'\x1b[33m{m.group(2)}\x1b[0m'  # strings
+        return f'\x1b[36m{m.group(3)}\x1b[0m'      # keywords
+    print(_HIGHLIGHT_RE.sub(paint, code))
+    print()
+
+def prompt_user_for_description(class_hierarchy, method_name, method_code):
     print(f"\nNo JavaDoc found for method '{method_name}' ({class_hierarchy}).")
     print("\n ------- ================== ------- \n")
     print_highlighted_java_code(method_code)
@@ -96,8 +381,50 @@ def prompt_user_for_description(class_hierarchy, method_name, method_code, java_
     description = input(f"Please provide a brief description for the method '{method_name}': ")
     return description
 
-def generate_javadoc(class_hierarchy, method_code, user_description):
-    prompt = f"""Generate a JavaDoc comment for the following Java method. The method is situated in: `{class_hierarchy}` performs the following: {user_description}
+# Constrains per-method responses to bare javadoc text inside JSON, so no
+# conversational preamble or whitespace needs cleaning afterwards
+_JAVADOC_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "javadoc",
+        "schema": {
+            "type": "object",
+            "properties": {"javadoc": {"type": "string"}},
+            "required": ["javadoc"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# String literals are matched first (and kept) so a '//' inside one, e.g.
+# in a URL, is not mistaken for a comment
+_INLINE_COMMENT_RE = re.compile(r'("(?:\\.|[^"\\\n])*")|//[^\n]*')
+_LONG_STRING_RE = re.compile(r'"(?:\\.|[^"\\\n]){40,}"')
+_PROMPT_CODE_BUDGET = 1500
+
+def _compact_for_prompt(method_code):
+    """
+    Shrink the method source sent to the model: the javadoc only depends on
+    the signature and overall structure, so inline comments, long string
+    literal contents and deep indentation are dead input tokens. Bodies over
+    the budget keep their head and tail with the middle elided.
+    """
+    lines = method_code.splitlines()
+    indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    common_indent = min(indents) if indents else 0
+    code = '\n'.join(line[common_indent:] for line in lines)
+
+    code = _LONG_STRING_RE.sub('"…"', code)
+    code = _INLINE_COMMENT_RE.sub(lambda m: m.group(1) or '', code)
+    code = _BLANK_RUN_RE.sub('\n', code)
+
+    if len(code) > _PROMPT_CODE_BUDGET:
+        code = code[:700] + '\n/* ... elided ... */\n' + code[-700:]
+    return code
+
+def build_method_prompt(class_hierarchy, method_code, user_description):
+    method_code = _compact_for_prompt(method_code)
+    return f"""Generate a JavaDoc comment for the following Java method. The method is situated in: `{class_hierarchy}` performs the following: {user_description}
 
 Method:
 ```
@@ -106,105 +433,378 @@ Method:
 
 JavaDoc:"""
 
+def generate_javadoc(class_hierarchy, method_code, user_description):
+    cached = _javadoc_cache_get(method_code, user_description)
+    if cached is not None:
+        return cached
+
+    prompt = build_method_prompt(class_hierarchy, method_code, user_description)
+
     try:
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
+            model=MODEL,
             messages=[
-                {"role": "system", "content": """You are a Java documentation assistant, use proper JavaDoc notation ({@link}, etc). Thrown ResponseStatusException (HTTPS errors) are seen as a return type, use this format to bypass this limitation (custom returns) (this is an example):
-/**
-* <detailed description>
-* 
-* <br>
-* <br>
-* <b>Returns:</b>
-* <ul>
-* <li>{@link HttpStatus#BAD_REQUEST} Invalid language.</li>
-* <li>{@link HttpStatus#BAD_REQUEST} Invalid email.</li>
-* <li>{@link HttpStatus#BAD_REQUEST} Invalid source.</li>
-* </ul>
-* 
-* @return {@link HttpStatus#ACCEPTED} : {@link QuestionResponse}
-*/
-
-If no Http error is returned, use this format:
-/**
-* <detailed description>
-*
-* <params, if present>
-* @return {@link HttpStatus#ACCEPTED} : {@link <type>}
-*/
-
-Do not specify if it returns a Void type.
-Put the javadoc elements in this order: <description> <custom returns> <params> <returns> <throws> <return>.
-Only specify http errors in the <custom returns> section, for regular @returns, use standard JavaDoc."""},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.5,
-            max_tokens=200
+            response_format=_JAVADOC_RESPONSE_FORMAT,
+            temperature=0.2,
+            top_p=1,
+            max_tokens=_max_tokens_for(method_code)
         )
-        raw_javadoc = response.choices[0].message.content.strip()
-        # Clean up: remove excessive empty lines and whitespace
-        lines = [line.strip() for line in raw_javadoc.splitlines() if line.strip() != '']
-        javadoc = '\n'.join(lines)
-
+        javadoc = json.loads(response.choices[0].message.content)["javadoc"]
+        _javadoc_cache_put(method_code, user_description, javadoc)
         return javadoc
     except Exception as e:
         print(f"Error generating JavaDoc: {e}")
         return None
 
-def insert_javadoc(java_code_lines, line_number, javadoc):
+async def generate_javadoc_async(class_hierarchy, method_code, user_description, sem):
+    cached = _javadoc_cache_get(method_code, user_description)
+    if cached is not None:
+        return cached
+
+    prompt = build_method_prompt(class_hierarchy, method_code, user_description)
+
+    async with sem:
+        for backoff in (1, 2, 4, None):
+            try:
+                response = await async_client.chat.completions.create(
+                    model=MODEL,
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    response_format=_JAVADOC_RESPONSE_FORMAT,
+                    temperature=0.2,
+                    top_p=1,
+                    max_tokens=_max_tokens_for(method_code)
+                )
+                javadoc = json.loads(response.choices[0].message.content)["javadoc"]
+                _javadoc_cache_put(method_code, user_description, javadoc)
+                return javadoc
+            except RateLimitError:
+                if backoff is None:
+                    print("Rate limit exceeded, giving up on this method.")
+                    return None
+                await asyncio.sleep(backoff)
+            except Exception as e:
+                print(f"Error generating JavaDoc: {e}")
+                return None
+
+async def _gather_javadocs(jobs):
+    sem = asyncio.Semaphore(20)
+    results = [None] * len(jobs)
+    done = 0
+
+    async def run(i, job):
+        nonlocal done
+        results[i] = await generate_javadoc_async(job['hierarchy'], job['code'], job['description'], sem)
+        done += 1
+        if results[i] is not None:
+            print(f"Generated JavaDoc for '{job['name']}' ({done}/{len(jobs)})")
+        else:
+            print(f"Generation failed for '{job['name']}' ({done}/{len(jobs)})")
+
+    await asyncio.gather(*(run(i, job) for i, job in enumerate(jobs)))
+    return results
+
+def generate_javadocs_concurrent(jobs, indices=None):
     """
-    Insert the JavaDoc comment above the specified line number, with proper indentation.
+    Fan out one request per job over the async client; the calls are
+    network-bound so they run concurrently under a semaphore. `indices`
+    maps results back to the caller's job numbering.
+    """
+    results = asyncio.run(_gather_javadocs(jobs))
+    if indices is None:
+        indices = range(len(jobs))
+    return dict(zip(indices, results))
+
+def clean_javadoc(raw_javadoc):
+    # Clean up: remove excessive empty lines and whitespace
+    lines = [line.strip() for line in raw_javadoc.strip().splitlines() if line.strip() != '']
+    return '\n'.join(lines)
+
+def generate_javadocs_batch(jobs):
+    """
+    Generate JavaDocs for all jobs in a single chat-completion request.
+    The system prompt is sent once instead of once per method. Returns a dict
+    mapping job index to javadoc text; falls back to per-method calls if the
+    batched response cannot be parsed.
+    """
+    javadocs = {}
+    pending = []
+    for i, job in enumerate(jobs):
+        cached = _javadoc_cache_get(job['code'], job['description'])
+        if cached is not None:
+            javadocs[i] = cached
+        else:
+            pending.append(i)
+    if not pending:
+        return javadocs
+
+    blocks = []
+    for i in pending:
+        job = jobs[i]
+        blocks.append(f"""=== METHOD {i}: {job['name']} ===
+The method is situated in: `{job['hierarchy']}` and performs the following: {job['description']}
+
+Method:
+```
+{_compact_for_prompt(job['code'])}
+```""")
+
+    prompt = f"""Generate a JavaDoc comment for each of the following Java methods.
+
+{chr(10).join(blocks)}"""
+
+    batch_instructions = """
+
+You will receive several methods delimited by `=== METHOD i: name ===` blocks. Respond with a JSON object {"javadocs": [{"index": i, "javadoc": "..."}]} containing one entry per method."""
+
+    try:
+        response = client.chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT + batch_instructions},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.2,
+            top_p=1,
+            max_tokens=sum(_max_tokens_for(jobs[i]['code']) for i in pending)
+        )
+        parsed = json.loads(response.choices[0].message.content)
+        entries = parsed.get('javadocs', parsed) if isinstance(parsed, dict) else parsed
+        for entry in entries:
+            index = int(entry['index'])
+            if index in pending:
+                javadoc = clean_javadoc(entry['javadoc'])
+                javadocs[index] = javadoc
+                _javadoc_cache_put(jobs[index]['code'], jobs[index]['description'], javadoc)
+        return javadocs
+    except Exception as e:
+        print(f"Batched JavaDoc generation failed ({e}), falling back to per-method requests.")
+        javadocs.update({i: result for i, result in
+                         generate_javadocs_concurrent([jobs[i] for i in pending], pending).items()})
+        return javadocs
+
+def insert_javadoc(java_code, line_offsets, line_number, javadoc, edits):
+    """
+    Record an edit inserting the JavaDoc comment above the specified line
+    number, with proper indentation. Edits are applied in one pass by
+    apply_edits instead of splicing a list of lines per method.
     """
     insert_at = line_number - 1
     while insert_at > 0:
-        line = java_code_lines[insert_at - 1].strip()
+        line = get_line(java_code, line_offsets, insert_at).strip()
         if line.startswith("@"):
             insert_at -= 1
         else:
             break
 
     # Detect indentation of the method line
-    method_line = java_code_lines[line_number - 1]
-    indent_match = re.match(r'^(\s*)', method_line)
-    indent = indent_match.group(1) if indent_match else ''
+    method_line = get_line(java_code, line_offsets, line_number)
+    indent = method_line[:len(method_line) - len(method_line.lstrip())]
 
     # Prepare indented javadoc lines
     javadoc_lines = [f"{indent}{line.strip()}" for line in javadoc.split('\n') if line.strip()]
 
-    # Insert a blank line before for separation
-    return java_code_lines[:insert_at] + javadoc_lines + java_code_lines[insert_at:]
+    edits.append((line_offsets[insert_at], '\n'.join(javadoc_lines) + '\n'))
 
-def extract_full_method_code(java_code_lines, start_line):
+def apply_edits(java_code, edits):
     """
-    Extracts the complete method code block from the Java source lines,
-    starting from `start_line` using curly brace matching.
+    Build the output once: walk the source and the offset-sorted edits in a
+    single pass and join, instead of re-copying the file per insertion.
     """
-    start_idx = start_line - 1  # Convert to 0-based index
-    method_lines = []
-    open_braces = 0
-    started = False
-
-    for i in range(start_idx, len(java_code_lines)):
-        line = java_code_lines[i]
-        method_lines.append(line)
-
-        # Count braces to detect method body
-        open_braces += line.count('{')
-        open_braces -= line.count('}')
-
-        if '{' in line:
-            started = True
+    out = []
+    prev = 0
+    for offset, text in sorted(edits, key=lambda e: e[0]):
+        out.append(java_code[prev:offset])
+        out.append(text)
+        prev = offset
+    out.append(java_code[prev:])
+    return ''.join(out)
+
+_CODE, _LINE_COMMENT, _BLOCK_COMMENT, _STRING, _CHAR = range(5)
+
+if _HAVE_NUMBA:
+    @njit(cache=True)
+    def _scan_braces_kernel(buf):
+        """
+        One pass over the whole file: for every character, the running brace
+        depth (comments/strings excluded) and whether it sits in CODE state.
+        """
+        n = buf.shape[0]
+        depth = np.empty(n, dtype=np.int32)
+        in_code = np.zeros(n, dtype=np.uint8)
+        state = 0  # _CODE
+        d = 0
+        i = 0
+        while i < n:
+            c = buf[i]
+            if state == 0:
+                in_code[i] = 1
+                if c == 123:  # {
+                    d += 1
+                elif c == 125:  # }
+                    d -= 1
+                elif c == 47 and i + 1 < n:  # /
+                    if buf[i + 1] == 47:
+                        state = 1
+                    elif buf[i + 1] == 42:  # *
+                        # Skip the '*' so "/*/" does not close immediately
+                        depth[i] = d
+                        i += 1
+                        state = 2
+                elif c == 34:  # "
+                    state = 3
+                elif c == 39:  # '
+                    state = 4
+            elif state == 1:
+                if c == 10:  # \n
+                    state = 0
+            elif state == 2:
+                if c == 42 and i + 1 < n and buf[i + 1] == 47:
+                    depth[i] = d
+                    i += 1
+                    state = 0
+            elif state == 3:
+                if c == 92 and i + 1 < n:  # backslash
+                    depth[i] = d
+                    i += 1
+                elif c == 34:
+                    state = 0
+            elif state == 4:
+                if c == 92 and i + 1 < n:
+                    depth[i] = d
+                    i += 1
+                elif c == 39:
+                    state = 0
+            depth[i] = d
+            i += 1
+        return depth, in_code
+
+def build_brace_scan(java_code):
+    """
+    Precompute the brace-depth profile of the whole file with the compiled
+    kernel, so each method-end lookup becomes array math instead of a Python
+    character loop. Returns None when numba is unavailable, in which case
+    _find_method_end runs per method instead.
+    """
+    if not _HAVE_NUMBA:
+        return None
+    # utf-32-le gives one uint32 per code point, so array indices line up
+    # with str offsets even for non-ASCII sources
+    buf = np.frombuffer(java_code.encode('utf-32-le'), dtype=np.uint32)
+    depth, in_code = _scan_braces_kernel(buf)
+    return buf, depth, in_code
 
-        if started and open_braces == 0:
-            break
+def _find_method_end_scanned(scan, start_offset):
+    """
+    Same contract as _find_method_end, answered from the precomputed scan.
+    """
+    buf, depth, in_code = scan
+    n = buf.shape[0]
+    if start_offset >= n:
+        return n
+    base = depth[start_offset - 1] if start_offset > 0 else 0
+
+    tail = depth[start_offset:]
+    above = tail > base
+    if not above.any():
+        # No body: bodyless (abstract/interface) method, stop at its ';'
+        semis = np.nonzero((buf[start_offset:] == 59) & (in_code[start_offset:] == 1))[0]
+        return start_offset + int(semis[0]) + 1 if semis.size else n
+
+    open_at = int(np.argmax(above))
+    semis = np.nonzero((buf[start_offset:start_offset + open_at] == 59)
+                       & (in_code[start_offset:start_offset + open_at] == 1))[0]
+    if semis.size:
+        return start_offset + int(semis[0]) + 1
+
+    closes = np.nonzero(tail[open_at:] == base)[0]
+    if closes.size:
+        return start_offset + open_at + int(closes[0]) + 1
+    return n
+
+def _find_method_end(src, start_offset):
+    """
+    Return the offset just past the end of the method starting at
+    start_offset, by walking a CODE/comment/string state machine so braces
+    inside literals and comments are not counted. Also stops at a bare ';'
+    for abstract/interface methods that have no body.
+    """
+    state = _CODE
+    depth = 0
+    started = False
 
-    return '\n'.join(method_lines)
+    i = start_offset
+    n = len(src)
+    while i < n:
+        c = src[i]
+        if state == _CODE:
+            if c == '{':
+                depth += 1
+                started = True
+            elif c == '}':
+                depth -= 1
+                if started and depth == 0:
+                    return i + 1
+            elif c == ';' and not started:
+                return i + 1
+            elif c == '/' and i + 1 < n:
+                if src[i + 1] == '/':
+                    state = _LINE_COMMENT
+                    i += 1
+                elif src[i + 1] == '*':
+                    state = _BLOCK_COMMENT
+                    i += 1
+            elif c == '"':
+                state = _STRING
+            elif c == "'":
+                state = _CHAR
+        elif state == _LINE_COMMENT:
+            if c == '\n':
+                state = _CODE
+        elif state == _BLOCK_COMMENT:
+            if c == '*' and i + 1 < n and src[i + 1] == '/':
+                state = _CODE
+                i += 1
+        elif state == _STRING:
+            if c == '\\':
+                i += 1
+            elif c == '"':
+                state = _CODE
+        elif state == _CHAR:
+            if c == '\\':
+                i += 1
+            elif c == "'":
+                state = _CODE
+        i += 1
+
+    return n
+
+def extract_full_method_code(java_code, line_offsets, start_line, scan=None):
+    """
+    Extracts the complete method code block from the Java source, starting
+    from `start_line`, as a single slice of the original string.
+    """
+    start = line_offsets[start_line - 1]
+    if scan is not None:
+        end = _find_method_end_scanned(scan, start)
+    else:
+        end = _find_method_end(java_code, start)
+    # Include the remainder of the closing line
+    newline = java_code.find('\n', end)
+    return java_code[start:newline] if newline != -1 else java_code[start:]
 
 
 def main():
-    if len(sys.argv) > 1:
-        java_file_path = sys.argv[1]
+    args = [arg for arg in sys.argv[1:] if arg != '--strict']
+    strict = '--strict' in sys.argv[1:]
+    if args:
+        java_file_path = args[0]
     else:
         java_file_path = input("Enter the path to the .java file: ").strip()
 
@@ -212,29 +812,48 @@ def main():
         print("File not found.")
         return
 
-    java_code = read_java_file(java_file_path)
-    java_code_lines = java_code.split('\n')
-    method_positions = get_method_positions(java_code)
+    java_code, line_offsets = read_java_file(java_file_path)
+    # Methods the regex cannot see would be silently skipped, so the
+    # heuristic shortcut must not override an explicit --strict parse
+    if not strict and _fast_all_documented(java_code):
+        print("All methods already have a JavaDoc, nothing to do.")
+        return
+
+    method_positions = get_method_positions(java_code, strict=strict)
     # we start from the end
-    method_positions.sort(key=lambda m: m['position'].line, reverse=True)
+    method_positions.sort(key=lambda m: m['position'][0], reverse=True)
 
+    # Pass 1: collect a description for every undocumented method
+    brace_scan = build_brace_scan(java_code)
+    jobs = []
     for method in method_positions:
-        line_number = method['position'].line
-        if not has_javadoc(java_code_lines, line_number):
-            # Extract method code (simple approach: take 10 lines starting from method declaration)
-            method_code_snippet = extract_full_method_code(java_code_lines, line_number)
-            user_description = prompt_user_for_description(method['hierarchy'], method['name'], method_code_snippet, java_code_lines, line_number)
-            javadoc = generate_javadoc(method['hierarchy'], method_code_snippet, user_description)
-            if javadoc:
-                java_code_lines = insert_javadoc(java_code_lines, line_number, javadoc)
-                print(f"JavaDoc added for method '{method['name']}'.")
-                print("\n ------- ================== ------- \n")
-                print_highlighted_java_code(javadoc)
-                print("\n ------- ================== ------- \n")
-            else:
-                print(f"Failed to generate JavaDoc for method '{method['name']}'.")
-
-    updated_java_code = '\n'.join(java_code_lines)
+        line_number = method['position'][0]
+        if not has_javadoc(java_code, line_offsets, line_number):
+            method_code_snippet = extract_full_method_code(java_code, line_offsets, line_number, brace_scan)
+            user_description = prompt_user_for_description(method['hierarchy'], method['name'], method_code_snippet)
+            jobs.append({
+                'name': method['name'],
+                'hierarchy': method['hierarchy'],
+                'code': method_code_snippet,
+                'line': line_number,
+                'description': user_description
+            })
+
+    # Pass 2: generate all JavaDocs in one request and record the edits
+    javadocs = generate_javadocs_batch(jobs) if jobs else {}
+    edits = []
+    for i, job in enumerate(jobs):
+        javadoc = javadocs.get(i)
+        if javadoc:
+            insert_javadoc(java_code, line_offsets, job['line'], javadoc, edits)
+            print(f"JavaDoc added for method '{job['name']}'.")
+            print("\n ------- ================== ------- \n")
+            print_highlighted_java_code(javadoc)
+            print("\n ------- ================== ------- \n")
+        else:
+            print(f"Failed to generate JavaDoc for method '{job['name']}'.")
+
+    updated_java_code = apply_edits(java_code, edits)
     write_java_file(java_file_path, updated_java_code)
     print(f"\nUpdated Java file saved to {java_file_path}")
 